@@ -0,0 +1,81 @@
+# Program to benchmark the memory footprint of the Risk environments.
+
+# Package imports:
+import argparse
+import gc
+import logging
+import sys
+import tracemalloc
+
+# User imports:
+from riskai import StupidAI
+from riskenv import RiskEnv
+from riskplayer import PlayerInfo
+
+# Module variables:
+
+## Default limits in bytes, with some headroom over the measured footprints,
+## so regressions make the benchmark fail:
+MAX_ENV_BYTES = 50000
+MAX_SNAPSHOT_BYTES = 1200
+MAX_ENCODING_BYTES = 256
+
+# Functions:
+
+## Measure the bytes allocated per object built by `factory`:
+def bytesPerObject(factory, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory() for i in range(count)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+## Memory footprint of one environment:
+def envFootprint(count=50):
+    opponents = [PlayerInfo("Dummy", "AI", StupidAI),
+                 PlayerInfo("Dummy2", "AI", StupidAI)]
+    return bytesPerObject(lambda: RiskEnv(opponents), count)
+
+## Memory footprint of one board snapshot:
+def snapshotFootprint(count=1000):
+    opponents = [PlayerInfo("Dummy", "AI", StupidAI),
+                 PlayerInfo("Dummy2", "AI", StupidAI)]
+    board = RiskEnv(opponents).board
+    return bytesPerObject(board.snapshot, count)
+
+## Memory footprint of one encoded board state:
+def encodingFootprint(count=1000):
+    opponents = [PlayerInfo("Dummy", "AI", StupidAI),
+                 PlayerInfo("Dummy2", "AI", StupidAI)]
+    board = RiskEnv(opponents).board
+    return bytesPerObject(board.encode, count)
+
+# Main function:
+if __name__ == "__main__":
+    logging.disable()
+
+    parser = argparse.ArgumentParser(
+        description="Measure the memory footprint of the Risk environments "
+                    "and fail if it exceeds the limits.")
+    parser.add_argument("--max-env-bytes", type=int, default=MAX_ENV_BYTES)
+    parser.add_argument("--max-snapshot-bytes", type=int,
+                        default=MAX_SNAPSHOT_BYTES)
+    parser.add_argument("--max-encoding-bytes", type=int,
+                        default=MAX_ENCODING_BYTES)
+    args = parser.parse_args()
+
+    failed = False
+    for name, size, limit in (
+            ("env", envFootprint(), args.max_env_bytes),
+            ("snapshot", snapshotFootprint(), args.max_snapshot_bytes),
+            ("encoding", encodingFootprint(), args.max_encoding_bytes)):
+        exceeded = size > limit
+        failed = failed or exceeded
+        print("Bytes per %-9s %10.0f (limit %d)%s" %
+              (name + ":", size, limit, " EXCEEDED" if exceeded else ""))
+
+    sys.exit(1 if failed else 0)
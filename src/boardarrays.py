@@ -0,0 +1,67 @@
+# Module to read the Risk game board into NumPy arrays for vectorized queries.
+
+# Package imports:
+import numpy as np
+
+# User imports:
+from topology import TOPOLOGY
+
+# Static map information:
+
+## Adjacency matrix between territory IDs:
+ADJACENCY = np.zeros((len(TOPOLOGY), len(TOPOLOGY)), dtype=bool)
+for _t, _neighbours in enumerate(TOPOLOGY.neighbours):
+    ADJACENCY[_t, list(_neighbours)] = True
+ADJACENCY.setflags(write=False)
+del _t, _neighbours
+
+## Directed borders sorted by source territory, and the first border of each
+## territory:
+EDGE_SOURCES, EDGE_TARGETS = np.array(
+    [(t, n) for t, neighbours in enumerate(TOPOLOGY.neighbours)
+     for n in neighbours]).T
+EDGE_START = np.searchsorted(EDGE_SOURCES, np.arange(len(TOPOLOGY)))
+
+## Territory IDs grouped by area, the first position of each area in that
+## order, and the area ID of each territory:
+TERRITORY_AREA = np.array(TOPOLOGY.territory_area)
+AREA_ORDER = np.argsort(TERRITORY_AREA, kind="stable")
+AREA_START = np.searchsorted(TERRITORY_AREA[AREA_ORDER],
+                             np.arange(len(TOPOLOGY.area_names)))
+
+## Upper bounds of the army count buckets used in the observations:
+ARMY_BINS = np.array([1, 3, 8, 20])
+
+# Functions:
+
+## Function to read the owners and forces of a board, indexed by territory ID:
+def boardArrays(board):
+    """
+    Returns the (owners, forces) arrays of `board`. Owners are given by the
+    player's color (player ID + 1), with 0 meaning an unowned territory.
+    The arrays are a copy: read them again after the board changes.
+    """
+    territories = board.world.by_id
+    owners = np.array([0 if t.owner is None else t.owner.color
+                       for t in territories], dtype=np.uint8)
+    forces = np.array([t.forces for t in territories], dtype=np.int32)
+    return owners, forces
+
+## Boolean mask of the territories bordering a territory of another player:
+def hostileMask(owners):
+    targets = owners[EDGE_TARGETS]
+    return np.logical_or.reduceat(
+        (owners[EDGE_SOURCES] != targets) & (targets != 0), EDGE_START)
+
+## Boolean mask of the territories whose owner holds their whole area:
+def areaOwnedMask(owners):
+    grouped = owners[AREA_ORDER]
+    low = np.minimum.reduceat(grouped, AREA_START)
+    high = np.maximum.reduceat(grouped, AREA_START)
+    return ((low == high) & (low != 0))[TERRITORY_AREA]
+
+## Boolean matrix of the valid (src, target) attacks of the player `color`:
+def attackMask(owners, forces, color):
+    owned = owners == color
+    enemy = ~owned & (owners != 0)
+    return (owned & (forces > 1))[:, None] & ADJACENCY & enemy
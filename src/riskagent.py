@@ -37,11 +37,14 @@ class FlattenRiskWrapper(ActionObservationWrapper):
   def __init__(self, env:RiskEnv):
     super(FlattenRiskWrapper, self).__init__(env)
 
-    game_state, territories = self.env.observation_space
-    new_observation_space = (game_state,)
-    for val in territories.spaces.values():
-      new_observation_space += val.spaces
-    self.observation_space = spaces.Tuple(new_observation_space)
+    # Array observations are already flat:
+    if not isinstance(self.env.observation_space,
+                      (spaces.Box, spaces.MultiDiscrete)):
+      game_state, territories = self.env.observation_space
+      new_observation_space = [game_state]
+      for val in territories.spaces.values():
+        new_observation_space.extend(val.spaces)
+      self.observation_space = spaces.Tuple(new_observation_space)
 
     action_space_size = 1
     self._action_space_shape = tuple([val.n for val in self.env.action_space.spaces])
@@ -63,14 +66,17 @@ class FlattenRiskWrapper(ActionObservationWrapper):
     raise NotImplementedError
 
   def observation(self, observation):
+    # Array observations are views of the env's buffer, which the next step
+    # overwrites, so the replay memory needs a copy:
+    if isinstance(observation, np.ndarray):
+      return np.array(observation)
     assert isinstance(observation, tuple)
     game_state, territories = observation
     assert isinstance(territories, dict)
-    new_observation = (game_state,)
+    new_observation = [game_state]
     for val in territories.values():
-      assert isinstance(val, tuple)
-      new_observation += val
-    return new_observation
+      new_observation.extend(val)
+    return tuple(new_observation)
 
 
 class DqnAgent(object):
@@ -81,8 +87,12 @@ class DqnAgent(object):
     nb_actions = self.action_space.n
     print('nb_actions', nb_actions)
     self.observation_space = env.observation_space
+    if isinstance(self.observation_space, (spaces.Box, spaces.MultiDiscrete)):
+      observation_size = self.observation_space.shape[0]
+    else:
+      observation_size = len(self.observation_space)
     model = Sequential()
-    model.add(Flatten(input_shape=(1,len(self.observation_space))))
+    model.add(Flatten(input_shape=(1,observation_size)))
     model.add(Dense(60, activation='relu'))
     model.add(Dense(nb_actions))
     model.add(Activation('softmax'))
@@ -3,7 +3,10 @@
 # Package imports:
 import collections
 import logging
-import random
+
+# User imports:
+from riskcombat import Threshold, odds
+from riskplanner import ChainPlanner
 
 # Classes:
 
@@ -12,48 +15,20 @@ class AI(object):
     """
     Base class for AIs to inherit from, containing some utility methods
     """
-    _sim_cache = {}
+    __slots__ = ("player", "game", "world", "logger")
     @classmethod
-    def simulate(cls, n_atk, n_def, tests=1000):
+    def simulate(cls, n_atk, n_def, tests=None):
         """
-        Simulates the outcome of a battle with `n_atk` attackers and `n_def`
-        defenders. The battle is simulated `tests` times, and the result cached
-        and shared between all AI instances.
+        Computes the exact outcome of a battle with `n_atk` attackers and
+        `n_def` defenders. The odds come from a table shared between all AI
+        instances and processes; `tests` is ignored and only kept for
+        compatibility with the old Monte-Carlo version.
 
         Returns a tuple (probability_of_victory,
                          avg_surviving_attackers,
                          avg_surviving_defenders)
         """
-        if (n_atk, n_def) in cls._sim_cache:
-            return cls._sim_cache[(n_atk, n_def)]
-        a_survive = []
-        d_survive = []
-        victory = 0
-        for i in range(tests):
-            a = n_atk
-            d = n_def
-            while a > 1 and d > 0:
-                atk_dice = min(a - 1, 3)
-                atk_roll = sorted([random.randint(1, 6) for i in range(atk_dice)], reverse=True)
-                def_dice = min(d, 2)
-                def_roll = sorted([random.randint(1, 6) for i in range(def_dice)], reverse=True)
-
-                for aa, dd in zip(atk_roll, def_roll):
-                    if aa > dd:
-                        d -= 1
-                    else:
-                        a -= 1
-            if d == 0:
-                a_survive.append(a)
-                victory += 1
-            else:
-                d_survive.append(d)
-
-        cls._sim_cache[(n_atk, n_def)] = (float(victory) / tests,
-                                          (float(sum(a_survive)) / victory) if victory else 0,
-                                          (float(sum(d_survive)) / (tests - victory)) if tests - victory else 0)
-        return cls._sim_cache[(n_atk, n_def)]
-
+        return odds(n_atk, n_def)
 
     def __init__(self, player, game, world):
         """
@@ -98,11 +73,12 @@ class AI(object):
         """
         pass
 
-    def event(self, msg):
+    def event(self, events):
         """
-        This method is called every time a game event occurs. `msg` will be a tuple
-        containing a string followed by a set of arguments, look in game.py to see
-        the types of messages that can be generated.
+        This method is called at the end of every turn when the board records
+        events (see `RiskBoard.enableEvents`). `events` is a tuple of the event
+        records of the turn, look in riskevents.py to see the types of records
+        that can be generated.
 
         Implement it if you want to know what is happening during other player's
         turns, etc.
@@ -117,7 +93,8 @@ class AI(object):
         `empty` is a list of unclaimed territory objects, or None if all have been claimed.
         `remaining` is the number of pieces the player has left to place.
 
-        Return a territory object or name, which must be in `empty` if it is not None.
+        Return a territory ID, which must be in `empty` if it is not None. Territory
+        objects and names are also accepted.
         """
         raise NotImplementedError
 
@@ -127,7 +104,8 @@ class AI(object):
 
         `available` is the number of pieces available.
 
-        Return a dictionary of territory object or name -> count, which should sum to `available`.
+        Return a dictionary of territory ID -> count, which should sum to `available`.
+        Territory objects and names are also accepted as keys.
         """
         raise NotImplementedError
 
@@ -137,7 +115,8 @@ class AI(object):
 
         Return or yield a sequence of (src, dest, atk_strategy, move_strategy) tuples.
 
-        `src` and `dest` must be territory objects or names.
+        `src` and `dest` must be territory IDs (territory objects and names are
+        also accepted).
         `atk_strategy` should be a function f(n_atk, n_def) which returns True to
         continue attacking, or None to use the default (attack until exhausted) strategy.
         `move_strategy` should be a function f(n_atk) which returns the number
@@ -150,7 +129,7 @@ class AI(object):
         Free movement section of the turn.
 
         Return a single tuple (src, dest, count) where `src` and `dest` are territory
-        objects or names, or None to skip this part of the turn.
+        IDs (or objects or names), or None to skip this part of the turn.
         """
         return None
 
@@ -160,78 +139,113 @@ class BetterAI(AI):
     BetterAI: Thinks about what it is doing a little more - picks a priority
     continent and priorities holding and reinforcing it.
     """
+    __slots__ = ("area_priority", "area_rank")
+
     def start(self):
-        self.area_priority = list(self.world.areas)
-        random.shuffle(self.area_priority)
+        self.area_priority = list(range(len(self.world.areas_by_id)))
+        self.game.rng.shuffle(self.area_priority)
+        self.area_rank = [None] * len(self.area_priority)
+        for rank, a in enumerate(self.area_priority):
+            self.area_rank[a] = rank
 
     def priority(self):
-        priority = sorted([t for t in self.player.territories if t.border],
-                          key=lambda x: self.area_priority.index(x.area.name))
-        priority = [t for t in priority if t.area == priority[0].area]
+        priority = sorted(self.player.frontier,
+                          key=lambda x: self.area_rank[x.area.id])
+        priority = [t for t in priority if t.area is priority[0].area]
         return priority if priority else list(self.player.territories)
 
 
     def initial_placement(self, empty, available):
         if empty:
-            empty = sorted(empty, key=lambda x: self.area_priority.index(x.area.name))
-            return empty[0]
+            empty = sorted(empty, key=lambda x: self.area_rank[x.area.id])
+            return empty[0].id
         else:
-            return random.choice(self.priority())
+            return self.game.rng.choice(self.priority()).id
 
     def reinforce(self, available):
         priority = self.priority()
         result = collections.defaultdict(int)
         while available:
-            result[random.choice(priority)] += 1
+            result[self.game.rng.choice(priority).id] += 1
             available -= 1
         return result
 
     def attack(self):
         for t in self.player.territories:
             if t.forces > 1:
-                adjacent = [a for a in t.connect if a.owner != t.owner and t.forces >= a.forces + 3]
+                adjacent = [a for a in t.connect if a.owner is not t.owner and t.forces >= a.forces + 3]
                 if len(adjacent) == 1:
-                        yield (t.name, adjacent[0].name,
-                               lambda a, d: a > d, None)
+                        yield (t.id, adjacent[0].id, Threshold(0), None)
                 else:
                     total = sum(a.forces for a in adjacent)
                     for adj in adjacent:
-                        yield (t, adj, lambda a, d: a > d + total - adj.forces + 3,
+                        yield (t.id, adj.id, Threshold(total - adj.forces + 3),
                                lambda a: 1)
 
     def freemove(self):
         srcs = sorted([t for t in self.player.territories if not t.border],
-                      key=lambda x: x.forces)
-        if srcs:
-            src = srcs[-1]
-            n = src.forces - 1
-            return (src, self.priority()[0], n)
+                      key=lambda x: x.forces, reverse=True)
+        priority = self.priority()
+        for src in srcs:
+            # Move to the first priority territory the troops can reach:
+            region = self.player.region(src)
+            targets = [t for t in priority if t in region]
+            if targets:
+                return (src.id, targets[0].id, src.forces - 1)
         return None
 
+## AI that plans whole-turn chains of attacks to complete areas:
+class PlannerAI(BetterAI):
+    """
+    PlannerAI: Plays like BetterAI, but first looks for the chain of attacks
+    with the best odds of completing an area this turn and follows it while
+    it keeps winning, before falling back to BetterAI's attacks.
+    """
+    __slots__ = ("planner", "min_probability")
+
+    def start(self):
+        super().start()
+        # A few milliseconds of planning per turn:
+        self.planner = ChainPlanner(self.game, budget=3000)
+        self.min_probability = 0.5
+
+    def attack(self):
+        plan = self.planner.bestPlan(self.player)
+        if plan is not None and plan.probability >= self.min_probability:
+            src = plan.src
+            for target in plan.targets:
+                yield (src, target, None, None)
+                if self.world.by_id[target].owner is not self.player:
+                    break
+                src = target
+        yield from super().attack()
+
 ## Stupid AI that picks random moves:
 class StupidAI(AI):
     """
     StupidAI: Plays a completely random game, randomly choosing and reinforcing
     territories, and attacking wherever it can without any considerations of wisdom.
     """
+    __slots__ = ()
+
     def initial_placement(self, empty, remaining):
         if empty:
-            return random.choice(empty)
+            return self.game.rng.choice(empty).id
         else:
-            t = random.choice(list(self.player.territories))
-            return t
+            t = self.game.rng.choice(list(self.player.territories))
+            return t.id
 
     def attack(self):
         for t in self.player.territories:
             for a in t.connect:
-                if a.owner != self.player:
+                if a.owner is not self.player:
                     if t.forces > a.forces:
-                        yield (t, a, None, None)
+                        yield (t.id, a.id, None, None)
 
     def reinforce(self, available):
-        border = [t for t in self.player.territories if t.border]
+        border = list(self.player.frontier)
         result = collections.defaultdict(int)
         for i in range(available):
-            t = random.choice(border)
-            result[t] += 1
+            t = self.game.rng.choice(border)
+            result[t.id] += 1
         return result
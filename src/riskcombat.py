@@ -0,0 +1,366 @@
+# Module to resolve Risk battles from their exact outcome distributions.
+
+# Package imports:
+import bisect
+from collections import namedtuple
+import functools
+import hashlib
+import itertools
+import logging
+import os
+import random
+import tempfile
+
+import numpy as np
+
+# Module logger:
+logger = logging.getLogger("risk-combat")
+
+# Private functions:
+
+## Exact distribution of the troop losses in a single round of dice:
+def _roundOdds(atk_dice, def_dice):
+    counts = {}
+    for atk_roll in itertools.product(range(1, 7), repeat=atk_dice):
+        for def_roll in itertools.product(range(1, 7), repeat=def_dice):
+            atk_loss = def_loss = 0
+            for a, d in zip(sorted(atk_roll, reverse=True),
+                            sorted(def_roll, reverse=True)):
+                if a > d:
+                    def_loss += 1
+                else:
+                    atk_loss += 1
+            counts[(atk_loss, def_loss)] = counts.get((atk_loss, def_loss), 0) + 1
+    total = 6 ** (atk_dice + def_dice)
+    return tuple((n / total, atk_loss, def_loss)
+                 for (atk_loss, def_loss), n in sorted(counts.items()))
+
+# Module variables:
+
+## Round outcomes (probability, attacker loss, defender loss) for each pair
+## (attacker dice, defender dice):
+ROUND_ODDS = {(a, d): _roundOdds(a, d) for a in range(1, 4) for d in range(1, 3)}
+
+## Cumulative round probabilities, to draw a round with a single number:
+_ROUND_CDF = {dice: tuple(itertools.accumulate(p for p, a, d in odds))
+              for dice, odds in ROUND_ODDS.items()}
+
+## Round odds as arrays indexed by [attacker dice, defender dice, outcome],
+## padded with impossible outcomes, to resolve many battles at once:
+_BATCH_OUTCOMES = np.ones((4, 3), dtype=np.int64)
+_BATCH_CDF = np.full((4, 3, 3), 2.0)
+_BATCH_ATK_LOSS = np.zeros((4, 3, 3), dtype=np.int64)
+_BATCH_DEF_LOSS = np.zeros((4, 3, 3), dtype=np.int64)
+for (_a, _d), _odds in ROUND_ODDS.items():
+    _BATCH_OUTCOMES[_a, _d] = len(_odds)
+    for _k, (_p, _atk_loss, _def_loss) in enumerate(_odds):
+        _BATCH_CDF[_a, _d, _k] = _ROUND_CDF[(_a, _d)][_k]
+        _BATCH_ATK_LOSS[_a, _d, _k] = _atk_loss
+        _BATCH_DEF_LOSS[_a, _d, _k] = _def_loss
+del _a, _d, _odds, _k, _p, _atk_loss, _def_loss
+
+## Final states of a battle with their probabilities:
+Outcomes = namedtuple("Outcomes", ["states", "probabilities", "cdf"])
+
+## Largest force count stored in the odds table; larger battles are computed
+## on demand and kept in a bounded cache:
+ODDS_LIMIT = 64
+
+## Version of the odds table, derived from the round odds it is built from,
+## so a table built by different rules is never loaded:
+ODDS_VERSION = hashlib.sha256(
+    repr((ODDS_LIMIT, sorted(ROUND_ODDS.items()))).encode()).hexdigest()[:16]
+
+## Per-user directory the odds table is cached in:
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME",
+                   os.path.join(os.path.expanduser("~"), ".cache")),
+    "ml-risk")
+
+## File the odds table is persisted to, shared by every process of the user:
+ODDS_FILE = os.environ.get("RISK_ODDS_FILE",
+                           os.path.join(CACHE_DIR, "risk-odds-%d-%s.npy" %
+                                        (ODDS_LIMIT, ODDS_VERSION)))
+
+## Odds table, loaded on first use:
+_odds_table = None
+
+# Classes:
+
+## Attack strategy that keeps attacking while n_atk > n_def + margin:
+class Threshold(object):
+    """
+    Attack strategy f(n_atk, n_def) that returns True while the attacker has
+    more than `margin` troops over the defender. Unlike an equivalent lambda,
+    the board recognizes it and resolves the battle with a single draw from a
+    cached outcome table.
+    """
+    __slots__ = ("margin",)
+
+    def __init__(self, margin=0):
+        self.margin = margin
+
+    def __call__(self, n_atk, n_def):
+        return n_atk > n_def + self.margin
+
+    def __repr__(self):
+        return "Threshold(%s)" % self.margin
+
+# Functions:
+
+## Dice rolled by each side in a round:
+def dice(n_atk, n_def):
+    return (min(n_atk - 1, 3), min(n_def, 2))
+
+## Exact distribution of the final state of a battle:
+@functools.lru_cache(maxsize=1024)
+def outcomes(n_atk, n_def, margin=None):
+    """
+    Returns the `Outcomes` of a battle between `n_atk` attackers and `n_def`
+    defenders, as the sorted final (n_atk, n_def) states with their
+    probabilities. The attacker stops when it has a single troop left, when
+    the defender is wiped out, or, if `margin` is not None, when it no longer
+    has more than `margin` troops over the defender.
+    """
+    if margin is None:
+        return _outcomes(n_atk, n_def, None)
+    return _outcomes(n_atk, n_def, Threshold(margin))
+
+## Uncached distribution of the final state of a battle for any strategy:
+def _outcomes(n_atk, n_def, f_atk):
+    final = {}
+
+    # Every round removes one or two troops, so the states can be swept by
+    # decreasing total of troops:
+    pending = {n_atk + n_def: {(n_atk, n_def): 1.0}}
+    for total in range(n_atk + n_def, -1, -1):
+        for (a, d), p in pending.pop(total, {}).items():
+            if a <= 1 or d == 0 or (f_atk is not None and not f_atk(a, d)):
+                final[(a, d)] = final.get((a, d), 0.0) + p
+                continue
+            for q, atk_loss, def_loss in ROUND_ODDS[dice(a, d)]:
+                state = (a - atk_loss, d - def_loss)
+                layer = pending.setdefault(total - atk_loss - def_loss, {})
+                layer[state] = layer.get(state, 0.0) + p * q
+
+    states = tuple(sorted(final))
+    probabilities = tuple(final[s] for s in states)
+    return Outcomes(states, probabilities,
+                    tuple(itertools.accumulate(probabilities)))
+
+## Function to resolve a battle, returning the surviving (n_atk, n_def):
+def resolve(n_atk, n_def, f_atk=None, rand=random.random):
+    """
+    Resolves a battle with the same odds as rolling the dice round by round.
+
+    `f_atk` is the attack strategy f(n_atk, n_def), or None to attack until
+    exhausted. `rand` is a function returning uniform numbers in [0, 1).
+
+    The default strategy and `Threshold` strategies are resolved with a single
+    draw from the exact outcome distribution. Any other strategy is resolved
+    round by round, with a single draw per round.
+    """
+    if f_atk is None:
+        margin = None
+    elif isinstance(f_atk, Threshold):
+        margin = f_atk.margin
+    else:
+        while n_atk > 1 and n_def > 0 and f_atk(n_atk, n_def):
+            rolled = dice(n_atk, n_def)
+            odds = ROUND_ODDS[rolled]
+            cdf = _ROUND_CDF[rolled]
+            i = min(bisect.bisect_right(cdf, rand() * cdf[-1]), len(cdf) - 1)
+            n_atk -= odds[i][1]
+            n_def -= odds[i][2]
+        return (n_atk, n_def)
+
+    table = outcomes(n_atk, n_def, margin)
+    cdf = table.cdf
+    i = min(bisect.bisect_right(cdf, rand() * cdf[-1]), len(cdf) - 1)
+    return table.states[i]
+
+## Build the exact odds of every battle with up to `limit` troops per side:
+def _buildOddsTable(limit):
+    # table[0] is the probability of victory, table[1] the expected attackers
+    # left on victory and table[2] the expected defenders left on defeat, both
+    # weighted by the probability of the outcome.
+    table = np.zeros((3, limit + 1, limit + 1))
+    win, atk, dfn = table
+    for a in range(limit + 1):
+        for d in range(limit + 1):
+            if d == 0:
+                win[a, d] = 1.0
+                atk[a, d] = a
+            elif a <= 1:
+                dfn[a, d] = d
+            else:
+                for q, atk_loss, def_loss in ROUND_ODDS[dice(a, d)]:
+                    win[a, d] += q * win[a - atk_loss, d - def_loss]
+                    atk[a, d] += q * atk[a - atk_loss, d - def_loss]
+                    dfn[a, d] += q * dfn[a - atk_loss, d - def_loss]
+    return table
+
+## Function to get the odds table, loading or building it on first use:
+def oddsTable(path=None):
+    """
+    Returns the odds table as a read-only array. The table is memory-mapped
+    from `path` (by default `ODDS_FILE`); if the file is missing or fails the
+    checks of `_checkOddsTable`, the table is computed and saved there for the
+    next processes.
+    """
+    global _odds_table
+    if _odds_table is None:
+        path = path or ODDS_FILE
+        try:
+            table = np.load(path, mmap_mode="r", allow_pickle=False)
+            _checkOddsTable(table)
+        except (OSError, ValueError) as e:
+            if os.path.exists(path):
+                logger.warning("Rebuilding the odds table %s: %s", path, e)
+            table = _buildOddsTable(ODDS_LIMIT)
+            table.setflags(write=False)
+            _saveOddsTable(table, path)
+        _odds_table = table
+    return _odds_table
+
+## Function to check an odds table loaded from a file:
+def _checkOddsTable(table):
+    # Beyond the shape, the smallest battles are compared with a freshly
+    # built table, which includes well-known entries such as the 15/36 odds
+    # of one die against one die, and every probability must be in [0, 1].
+    shape = (3, ODDS_LIMIT + 1, ODDS_LIMIT + 1)
+    if table.shape != shape or table.dtype != np.float64:
+        raise ValueError("unexpected shape %s or type %s" %
+                         (table.shape, table.dtype))
+    if table[0, 2, 1] != 15/36 or not np.array_equal(table[:, :5, :5],
+                                                      _buildOddsTable(4)):
+        raise ValueError("wrong odds for small battles")
+    if not ((table[0] >= 0) & (table[0] <= 1)).all():
+        raise ValueError("probabilities out of range")
+
+## Function to save an odds table for the next processes:
+def _saveOddsTable(table, path):
+    directory = os.path.dirname(path) or "."
+    tmp = None
+    try:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see a
+        # partial table:
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".npy")
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, table)
+        os.replace(tmp, path)
+    except OSError as e:
+        logger.warning("Could not save the odds table to %s: %s", path, e)
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+
+## Odds of battles larger than the odds table:
+@functools.lru_cache(maxsize=4096)
+def _largeOdds(n_atk, n_def):
+    table = outcomes(n_atk, n_def)
+    win = atk = dfn = 0.0
+    for (a, d), p in zip(table.states, table.probabilities):
+        if d == 0:
+            win += p
+            atk += p * a
+        else:
+            dfn += p * d
+    return (win, atk, dfn)
+
+## Function to get the exact odds of a battle fought until exhaustion:
+def odds(n_atk, n_def):
+    """
+    Returns a tuple (probability_of_victory,
+                     avg_surviving_attackers,
+                     avg_surviving_defenders)
+    where the average attackers are taken over the victories and the average
+    defenders over the defeats.
+    """
+    if n_atk <= ODDS_LIMIT and n_def <= ODDS_LIMIT:
+        table = oddsTable()
+        win = float(table[0, n_atk, n_def])
+        atk = float(table[1, n_atk, n_def])
+        dfn = float(table[2, n_atk, n_def])
+    else:
+        win, atk, dfn = _largeOdds(n_atk, n_def)
+    lose = 1.0 - win
+    return (win,
+            atk / win if win > 0 else 0,
+            dfn / lose if lose > 0 else 0)
+
+## Function to resolve many battles at once:
+def batchResolve(n_atk, n_def, rng=None, margin=None):
+    """
+    Resolves the battles between the arrays `n_atk` and `n_def` with the same
+    odds as `resolve`, advancing all of them one round per vectorized step.
+
+    `rng` is a `RiskRandom`, a `np.random.Generator` or None (fresh entropy).
+    `margin` is None to attack until exhausted, or a scalar or array of
+    `Threshold` margins.
+
+    Returns the arrays (surviving attackers, surviving defenders, conquered).
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    generator = getattr(rng, "generator", rng)
+
+    a = np.array(n_atk, dtype=np.int64)
+    d = np.array(n_def, dtype=np.int64)
+    a, d = np.broadcast_arrays(a, d)
+    a = a.copy()
+    d = d.copy()
+    if margin is not None:
+        margin = np.broadcast_to(np.asarray(margin, dtype=np.int64), a.shape)
+
+    active = (a > 1) & (d > 0)
+    if margin is not None:
+        active &= a > d + margin
+
+    idx = np.flatnonzero(active)
+    while len(idx):
+        atk_dice = np.minimum(a.flat[idx] - 1, 3)
+        def_dice = np.minimum(d.flat[idx], 2)
+
+        # Draw one round for every active battle:
+        u = generator.random(len(idx))
+        k = (_BATCH_CDF[atk_dice, def_dice] <= u[:, None]).sum(axis=1)
+        k = np.minimum(k, _BATCH_OUTCOMES[atk_dice, def_dice] - 1)
+        a.flat[idx] -= _BATCH_ATK_LOSS[atk_dice, def_dice, k]
+        d.flat[idx] -= _BATCH_DEF_LOSS[atk_dice, def_dice, k]
+
+        still = (a.flat[idx] > 1) & (d.flat[idx] > 0)
+        if margin is not None:
+            still &= a.flat[idx] > d.flat[idx] + margin.flat[idx]
+        idx = idx[still]
+
+    return (a, d, d == 0)
+
+## Function to get the expected result of a battle without resolving it:
+def expected(n_atk, n_def, f_atk=None):
+    """
+    Returns a tuple (probability_of_conquest,
+                     expected_surviving_attackers,
+                     expected_surviving_defenders)
+    for a battle fought with the attack strategy `f_atk`, with both
+    expectations taken over every outcome. The default and `Threshold`
+    strategies are answered from the cached tables; any other strategy has
+    its outcome distribution computed on the spot.
+    """
+    if f_atk is None:
+        # A lost battle always leaves a single attacker:
+        win, atk, dfn = odds(n_atk, n_def)
+        return (win, win * atk + (1.0 - win), (1.0 - win) * dfn)
+
+    if isinstance(f_atk, Threshold):
+        table = outcomes(n_atk, n_def, f_atk.margin)
+    else:
+        table = _outcomes(n_atk, n_def, f_atk)
+
+    win = atk = dfn = 0.0
+    for (a, d), p in zip(table.states, table.probabilities):
+        if d == 0:
+            win += p
+        atk += p * a
+        dfn += p * d
+    return (win, atk, dfn)
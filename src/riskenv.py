@@ -5,45 +5,82 @@ import gym
 from gym import spaces
 from gym.utils import seeding
 import logging
-import random
+import numpy as np
 
 # User imports:
+from boardarrays import ARMY_BINS
 from riskboard import RiskBoard
+from riskrandom import RiskRandom
+from topology import TOPOLOGY
 from world import KEY
 
 # Module logger:
 logger = logging.getLogger("risk-env")
-logger.setLevel(logging.DEBUG)
-logging.basicConfig()
 
 # Private variables:
 INVALID_ACTION = -1
 REWARD_LOSE = -1
 REWARD_VALID_ATTACK = 0.5
 REWARD_WIN = 1
-ARMY_OBSERVATION_RANGE = 5
+ARMY_OBSERVATION_RANGE = len(ARMY_BINS) + 1
 PLAYER_OBSERVATION_RANGE = 2
 
+## Territory IDs in the order of the observation keys:
+KEY_ORDER = tuple(TOPOLOGY.index[name] for name in KEY.values())
+
+## Observation key and position in the key order of each territory ID:
+KEY_OF = tuple(k for k, name in sorted(KEY.items(),
+                                       key=lambda k: TOPOLOGY.index[k[1]]))
+POSITION_OF = tuple(KEY_ORDER.index(t) for t in range(len(KEY_ORDER)))
+
+## Number of changed territories above which the observation is encoded again
+## instead of patched:
+PATCH_LIMIT = 12
+
+## Static graph of the map for the "graph" observation mode, indexed by
+## territory ID: the directed edges (both ways for each border) as a (2, E)
+## array, and the area ID of each territory:
+GRAPH_EDGES = np.array([(t, n) for t, neighbours in enumerate(TOPOLOGY.neighbours)
+                        for n in neighbours], dtype=np.int64).T.copy()
+GRAPH_EDGES.setflags(write=False)
+GRAPH_AREAS = np.array(TOPOLOGY.territory_area, dtype=np.int64)
+GRAPH_AREAS.setflags(write=False)
+
+## Territories whose node features may change with each territory: itself,
+## its neighbours (border flag) and its area (area-owned flag):
+GRAPH_AFFECTED = tuple(
+    frozenset((t,) + TOPOLOGY.neighbours[t] +
+              TOPOLOGY.area_members[TOPOLOGY.territory_area[t]])
+    for t in range(len(TOPOLOGY)))
+
 # Classes:
 
 ## Class to represent the OpenAI gym environment for the Risk game.
 class RiskEnv(gym.Env):
 
     # Class constructor:
-    def __init__(self, opponents, train_freemove=False):
+    def __init__(self, opponents, train_freemove=False, board_class=RiskBoard,
+                 observation_mode="dict", player_range=PLAYER_OBSERVATION_RANGE,
+                 army_bins=ARMY_BINS, observation_deltas=False):
 
         # Copy the opponent information:
-        self.country_list = sorted(list(KEY.values()))
+        # The action indexes are the territory IDs, which follow the
+        # alphabetical order of the territory names:
+        self.country_list = list(TOPOLOGY.names)
         self.opponents = opponents
         self.opponent_names = list(map(lambda o: o.name, opponents))
         self.player_num = len(opponents) + 1
         self.train_freemove = train_freemove
 
+        # Board engine used by the environment (RiskBoard or a subclass):
+        self.board_class = board_class
+
         # Action space:
         #   Country 1: Used as the argument in the ressuply phase and as the
-        # country where the attack originates from in the attack phase.
-        #   Country 2: Used as the country to be attacked in the attack phase.
-        #   Flag: If 1, end the attack phase.
+        # country where the attack or the freemove originates from.
+        #   Country 2: Used as the country to be attacked in the attack phase
+        # and as the destination of the freemove.
+        #   Flag: If 1, end the attack phase or skip the freemove.
         self.action_space = spaces.Tuple((
             spaces.Discrete(42),    # Country 1.
             spaces.Discrete(42),    # Country 2.
@@ -51,102 +88,72 @@ class RiskEnv(gym.Env):
         ))
 
         # Observation state:
-        #   Game state: Signal if the game is in the ressuply phase or the
-        # attack phase.
+        #   Game state: Signal if the game is in the ressuply phase, the
+        # attack phase or the freemove phase.
         #   Countries: Dictionary for the countries. Keys are the same of the
         # risk game implementation. Each country contains information about the
-        # owner of the country (0 is the Agent, others are enemy AIs) and the
-        # number of troops in it.
-        self.observation_space = spaces.Tuple((
-            spaces.Discrete(3),    # Game state.
-            # Countries.
-            spaces.Dict({
-                "a": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "b": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "c": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "d": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "e": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "f": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "g": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "h": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "i": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "j": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "k": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "l": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "m": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "n": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "o": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "p": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "q": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "r": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "s": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "t": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "u": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "v": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "w": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "x": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "y": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "z": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "A": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "B": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "C": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "D": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "E": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "F": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "G": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "H": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "I": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "J": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "K": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "L": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "M": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "N": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "O": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE))),
-                "P": spaces.Tuple((spaces.Discrete(PLAYER_OBSERVATION_RANGE),
-                                   spaces.Discrete(ARMY_OBSERVATION_RANGE)))
-            })
-        ))
+        # owner of the country and the number of troops in it.
+        #
+        # The "array" (uint8 Box) and "multidiscrete" (MultiDiscrete) modes
+        # hold the same values as a flat array: the game state channel first,
+        # then the owner and army codes of each country in key order.
+        #
+        # Owner codes: 1 for the Agent and 0 for the opponents. With a
+        # `player_range` over 2, opponents get codes from 2 on in the order
+        # they joined, clipped to the last code. Army codes are buckets with
+        # the upper bounds in `army_bins`.
+        assert observation_mode in ("dict", "array", "multidiscrete", "graph")
+        assert player_range >= 2
+        self.observation_mode = observation_mode
+        self.player_range = player_range
+        self.army_range = len(army_bins) + 1
+
+        # Translation tables from player IDs and force counts to codes. The
+        # Agent joins the board first, so its player ID is 0:
+        self._owner_lut = bytes(1 if i == 0 else
+                                min(i + 1, player_range - 1) if player_range > 2
+                                else 0 for i in range(256))
+        self._army_lut = bytes(np.searchsorted(army_bins, np.arange(256))
+                               .astype(np.uint8))
+
+        if(observation_mode == "graph"):
+            self._initGraph()
+
+        elif(observation_mode == "dict"):
+            country = spaces.Tuple((spaces.Discrete(self.player_range),
+                                    spaces.Discrete(self.army_range)))
+            self.observation_space = spaces.Tuple((
+                spaces.Discrete(3),    # Game state.
+                spaces.Dict({key: country for key in KEY})  # Countries.
+            ))
+
+        else:
+            nvec = np.array([3] + [self.player_range, self.army_range] *
+                            len(KEY_ORDER), dtype=np.uint8)
+            if(observation_mode == "array"):
+                self.observation_space = spaces.Box(low=0, high=nvec - 1,
+                                                    dtype=np.uint8)
+            else:
+                self.observation_space = spaces.MultiDiscrete(nvec,
+                                                              dtype=np.uint8)
+
+        # Every mode keeps the flat observation in a preallocated buffer, where
+        # only the territories changed since the last step are written. The
+        # array modes hand out a read-only view of it, which the next step
+        # overwrites, and the dict mode a copy of a patched dictionary.
+        self._obs = bytearray(1 + 2*len(KEY_ORDER))
+        self._obs_view = np.frombuffer(self._obs, dtype=np.uint8)
+        self._obs_view.setflags(write=False)
+        self._obs_dict = {}
+
+        # With `observation_deltas`, each observation also leaves in
+        # `observation_delta` the (indexes, values) of the flat observation
+        # entries it rewrote, for consumers storing trajectories:
+        self.observation_deltas = observation_deltas
+        self.observation_delta = None
+
+        # The board is created by the first reset and reused afterwards:
+        self.board = None
 
         # Generate a random seed for the game's logic.
         self.seed()
@@ -157,22 +164,18 @@ class RiskEnv(gym.Env):
     # Random seed generator:
     def seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
+
+        # The board, the AIs and the environment share one stream per env:
+        self.rng = RiskRandom(seed)
+        if self.board is not None:
+            self.board.rng = self.rng
+
         return [seed]
 
     # Reset board method:
     def reset(self):
-        # Create a new board for the players:
-        self.board = RiskBoard()
-
-        # Add the player information for the agent:
-        self.board.addPlayer("Agent", "Agent")
-
-        # Add the player information for the opponents:
-        for opponent in self.opponents:
-            self.board.addPlayer(opponent.name, opponent.type, opponent.ai)
-
-        # Start the game:
-        self.board.start()
+        # Start a new game on the board:
+        self._resetBoard()
 
         # Set the game phase:
         self.game_phase = 1
@@ -194,7 +197,7 @@ class RiskEnv(gym.Env):
             if(self.game_phase == 1):
 
                 # Make all the players that aren't the Agent play:
-                while((self.board.player.name != "Agent") and
+                while((self.board.player is not self.agent) and
                       (not self.board.finishedInitialPlacement())):
                     self.board.initialPlacement()
 
@@ -207,7 +210,7 @@ class RiskEnv(gym.Env):
                     if(self.board.initialPlacement(country) == 0):
                         # If there is another reinforcement to be done, return.
                         # Else, let's wait for the opponents.
-                        if(self.board.initial_troops["Agent"] != 0):
+                        if(self.board.initial_troops[self.agent.id] != 0):
                             return (self._getObs(), self._getReward(), False,
                                     info)
 
@@ -223,7 +226,7 @@ class RiskEnv(gym.Env):
             if(self.game_phase == 2):
 
                 # Make everybody that is not the Agent play:
-                while(self.board.player.name != "Agent"):
+                while(self.board.player is not self.agent):
                     self.board.fullTurn()   # Have the next player play.
 
                     # Did this player kill the Agent?
@@ -275,7 +278,7 @@ class RiskEnv(gym.Env):
                         self.game_phase = 5     # Freemove phase.
                         return (self._getObs(), self._getReward(), False, info)
                     else:
-                        self.board.turn += 1    # Pass the turn.
+                        self.board.endTurn()    # Pass the turn.
                         self.game_phase = 2     # Opponent's turn phase.
                         # Don't return anything! Wait for the opponents to play!
                         # Here is where the while loop comes in handy!
@@ -305,7 +308,7 @@ class RiskEnv(gym.Env):
                                 return (self._getObs(), self._getReward(),
                                         False, info)
                             else:
-                                self.board.turn += 1    # Pass the turn.
+                                self.board.endTurn()    # Pass the turn.
                                 self.game_phase = 2     # Opponent's turn phase.
                                 # Don't return anything!
                                 # Wait for the opponents to play!
@@ -321,37 +324,42 @@ class RiskEnv(gym.Env):
 
             # Agent freemove phase:
             if(self.game_phase == 5):
-                pass
-                # TODO Implement this phase... if needed.
+
+                # The Agent moves every troop but one from Country 1 to
+                # Country 2, or skips the freemove with the flag.
+                src = self._actionToCountry(action[0])
+                target = self._actionToCountry(action[1])
+                stop_flag = True if action[2] == 1 else False
+
+                if(not stop_flag):
+                    src_territory = self.board.world.territory(src)
+                    count = src_territory.forces - 1
+
+                    # If the freemove is invalid, the game is over:
+                    if(self.board.freemove(src_territory,
+                                           self.board.world.territory(target),
+                                           count) != 0):
+                        self.board.cleanUpBoard()
+                        return (self._getObs(), INVALID_ACTION, True, info)
+
+                self.board.endTurn()    # Pass the turn.
+                self.game_phase = 2     # Opponent's turn phase.
+                # Don't return anything! Wait for the opponents to play!
 
     # Private methods:
 
     ## Translate Agent input:
     def _actionToCountry(self, action):
-        return self.country_list[action]
+        return int(action)
 
     ## Determine the army count observation to give the agent:
     def _armyCountObservation(self, armies):
-        if(armies <= 1):
-            return 0
-
-        elif(armies <= 3):
-            return 1
-
-        elif(armies <= 8):
-            return 2
-
-        elif(armies <= 20):
-            return 3
-
-        else:
-            return 4
+        return self._army_lut[min(armies, 255)]
 
     ## Method to return a random border territory owned by the Agent:
     def _borderTerritory(self):
-        border_options = [t for t in self.board.players["Agent"].territories
-                          if t.border]
-        return random.choice(border_options)
+        border_options = list(self.agent.frontier)
+        return self.rng.choice(border_options).id
 
     ## Determine Agent's next action:
     def _gamePhaseCode(self):
@@ -377,29 +385,164 @@ class RiskEnv(gym.Env):
 
     ## Read the board:
     def _getObs(self):
-        territories = dict()
+        if(self.observation_mode == "graph"):
+            return (self._gamePhaseCode(), self._updateGraph())
 
-        for t_key, t_name in KEY.items():
-            territory = self.board.world.territories[t_name]
-            owner_name = territory.owner.name
-            owner_code = 1 if(owner_name == "Agent") else 0
-            army_count_code = self._armyCountObservation(territory.forces)
-            territories[t_key] = (owner_code, army_count_code)
+        changed = self._updateObs()
+        if(self.observation_mode != "dict"):
+            return self._obs_view
 
-        return (self._gamePhaseCode(), territories)
+        obs = self._obs
+        territories = self._obs_dict
+        if(changed is None):
+            territories.update(zip(KEY, zip(obs[1::2], obs[2::2])))
+        else:
+            for t in changed:
+                i = 1 + 2*POSITION_OF[t]
+                territories[KEY_OF[t]] = (obs[i], obs[i+1])
+
+        return (obs[0], dict(territories))
+
+    ## Write the territories changed since the last observation into the
+    ## buffer. Returns their IDs, or None if every territory was written:
+    def _updateObs(self):
+        obs = self._obs
+        obs[0] = self._gamePhaseCode()
+
+        dirty = self.board.dirty
+        owner_lut = self._owner_lut
+        army_lut = self._army_lut
+
+        if(len(dirty) > PATCH_LIMIT):
+            territories = self._obs_territories
+            obs[1::2] = bytes([t.owner.id for t in territories]).translate(
+                owner_lut)
+            forces = [t.forces for t in territories]
+            try:
+                obs[2::2] = bytes(forces).translate(army_lut)
+            except ValueError:
+                # A territory holds 256 troops or more:
+                obs[2::2] = [army_lut[min(f, 255)] for f in forces]
+            changed = None
+        else:
+            by_id = self.board.world.by_id
+            for t in dirty:
+                territory = by_id[t]
+                i = 1 + 2*POSITION_OF[t]
+                obs[i] = owner_lut[territory.owner.id]
+                forces = territory.forces
+                obs[i+1] = army_lut[forces if forces < 256 else 255]
+            changed = list(dirty)
+
+        if(self.observation_deltas):
+            index = [0]
+            for t in dirty:
+                i = 1 + 2*POSITION_OF[t]
+                index += (i, i+1)
+            index = np.array(index, dtype=np.uint8)
+            self.observation_delta = (index, self._obs_view[index])
+
+        dirty.clear()
+        return changed
+
+    ## Set up the "graph" observation mode:
+    def _initGraph(self):
+        # The map graph never changes, so it is published once in the
+        # metadata. Each step only returns the game state and the node
+        # features, one row per territory ID: a one-hot of the owner relative
+        # to the Agent (column 0 is the Agent, then the opponents in the order
+        # they joined), the army bucket, the border flag and the area-owned
+        # flag.
+        players = self.player_num
+        self.metadata = dict(self.metadata, edge_index=GRAPH_EDGES,
+                             territory_area=GRAPH_AREAS,
+                             area_values=TOPOLOGY.area_values,
+                             node_features=tuple("owner_%d" % i
+                                                 for i in range(players)) +
+                                           ("army", "border", "area_owned"))
+
+        features = players + 3
+        high = np.ones((len(TOPOLOGY), features), dtype=np.uint8)
+        high[:, players] = self.army_range - 1
+        self.observation_space = spaces.Tuple((
+            spaces.Discrete(3),    # Game state.
+            spaces.Box(low=0, high=high, dtype=np.uint8)    # Nodes.
+        ))
+
+        # One-hot owner columns of each player ID, relative to the Agent
+        # (player ID 0):
+        self._graph_owner = [bytes(int(i == p) for i in range(players))
+                             for p in range(players)]
+        self._graph_features = features
+        self._graph = bytearray(len(TOPOLOGY) * features)
+        self._graph_view = np.frombuffer(self._graph, dtype=np.uint8).reshape(
+            len(TOPOLOGY), features)
+        self._graph_view.setflags(write=False)
+
+    ## Write the node features changed since the last observation:
+    def _updateGraph(self):
+        dirty = self.board.dirty
+        by_id = self.board.world.by_id
+        owner_rows = self._graph_owner
+        army_lut = self._army_lut
+        features = self._graph_features
+        graph = self._graph
+
+        if(len(dirty) > PATCH_LIMIT):
+            rows = range(len(by_id))
+        else:
+            rows = set()
+            for t in dirty:
+                rows.update(GRAPH_AFFECTED[t])
+
+        for t in rows:
+            territory = by_id[t]
+            owner = territory.owner
+            forces = territory.forces
+            i = t * features
+            graph[i:i+features] = owner_rows[owner.id] + bytes((
+                army_lut[forces if forces < 256 else 255],
+                territory.hostile > 0,
+                territory.area.owner is owner))
+
+        dirty.clear()
+        return self._graph_view
 
     ## Get the Agent's reward:
     def _getReward(self):
-        return (self.board.players["Agent"].territory_count / 42)
+        return (self.agent.territory_count / 42)
 
     ## Check if the Agent is still alive:
     def _isAgentAlive(self):
-        return self.board.players["Agent"].alive
+        return self.agent.alive
+
+    ## Method to start a new game, reusing the board if it already exists:
+    def _resetBoard(self):
+        if self.board is None:
+            # Create a new board for the players:
+            self.board = self.board_class(self.rng)
+            self._obs_territories = [self.board.world.by_id[t]
+                                     for t in KEY_ORDER]
+            self.board.trackDirty()
+
+            # Add the player information for the agent:
+            self.board.addPlayer("Agent", "Agent")
+            self.agent = self.board.players["Agent"]
+
+            # Add the player information for the opponents:
+            for opponent in self.opponents:
+                self.board.addPlayer(opponent.name, opponent.type, opponent.ai)
+
+            # Start the game:
+            self.board.start()
+
+        else:
+            self.board.reset()
 
     ## Method to return a random territory owned by the Agent:
     def _randomTerritory(self):
-        options = [t for t in self.board.players["Agent"].territories]
-        return random.choice(options)
+        options = [t for t in self.agent.territories]
+        return self.rng.choice(options).id
 
 ## Class to represent the OpenAI gym environment for the reinforcement scenario
 ## in a Risk game.
@@ -407,33 +550,23 @@ class RiskReinforcementEnv(RiskEnv):
 
     # Reset board method:
     def reset(self):
-        # Create a new board for the players:
-        self.board = RiskBoard()
-
-        # Add the player information for the agent:
-        self.board.addPlayer("Agent", "Agent")
-
-        # Add the player information for the opponents:
-        for opponent in self.opponents:
-            self.board.addPlayer(opponent.name, opponent.type, opponent.ai)
-
-        # Start the game:
-        self.board.start()
+        # Start a new game on the board:
+        self._resetBoard()
 
         # Make all the players do the initial reinforcement:
         while(not self.board.finishedInitialPlacement()):
 
             # Rule for the players that aren't the Agent:
-            if(self.board.player.name != "Agent"):
+            if(self.board.player is not self.agent):
                 self.board.initialPlacement()
 
             # Rule for the Agent:
             else:
-                while(self.board.initial_troops["Agent"] != 0):
+                while(self.board.initial_troops[self.agent.id] != 0):
                     self.board.initialPlacement(self._randomTerritory());
 
         # Wait for the Agent's turn:
-        while(self.board.player.name != "Agent"):
+        while(self.board.player is not self.agent):
             self.board.fullTurn()   # Have the next player play.
 
 		# Configure the number of available troops:
@@ -498,33 +631,23 @@ class RiskAttackEnv(RiskEnv):
 
     # Reset board method:
     def reset(self):
-        # Create a new board for the players:
-        self.board = RiskBoard()
-
-        # Add the player information for the agent:
-        self.board.addPlayer("Agent", "Agent")
-
-        # Add the player information for the opponents:
-        for opponent in self.opponents:
-            self.board.addPlayer(opponent.name, opponent.type, opponent.ai)
-
-        # Start the game:
-        self.board.start()
+        # Start a new game on the board:
+        self._resetBoard()
 
         # Make all the players do the initial reinforcement:
         while(not self.board.finishedInitialPlacement()):
 
             # Rule for the players that aren't the Agent:
-            if(self.board.player.name != "Agent"):
+            if(self.board.player is not self.agent):
                 self.board.initialPlacement()
 
             # Rule for the Agent:
             else:
-                while(self.board.initial_troops["Agent"] != 0):
+                while(self.board.initial_troops[self.agent.id] != 0):
                     self.board.initialPlacement(self._borderTerritory());
 
         # Wait for the Agent's turn:
-        while(self.board.player.name != "Agent"):
+        while(self.board.player is not self.agent):
             self.board.fullTurn()   # Have the next player play.
 
         # Reinforce for the Agent:
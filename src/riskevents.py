@@ -0,0 +1,75 @@
+# Module to represent the stream of events of a Risk game.
+
+# Package imports:
+from collections import deque, namedtuple
+
+# Module variables:
+
+## Event records. Players and territories are given by their IDs:
+
+## A player placed `count` troops on a territory:
+PlacementEvent = namedtuple("PlacementEvent",
+                            ["turn", "player", "territory", "count"])
+
+## A battle, with the troops lost by each side:
+AttackEvent = namedtuple("AttackEvent",
+                         ["turn", "player", "src", "target", "defender",
+                          "attackers_lost", "defenders_lost"])
+
+## A territory changed hands, with the troops moved into it:
+ConquestEvent = namedtuple("ConquestEvent",
+                           ["turn", "player", "territory", "defender", "moved"])
+
+## A player lost its last territory:
+EliminationEvent = namedtuple("EliminationEvent", ["turn", "player", "by"])
+
+## A player ended its turn:
+TurnEndEvent = namedtuple("TurnEndEvent", ["turn", "player"])
+
+# Classes:
+
+## Class to collect the events of a board and deliver them in batches.
+class EventStream(object):
+    """
+    Events emitted by a board are queued and delivered as a tuple to every
+    subscriber when the board calls `flush()`, at the end of each turn. The
+    last `history` events, including the ones of the current turn, are also
+    kept in a ring buffer for debugging.
+
+    Boards only build event records when a stream is attached, so disabled
+    events cost a single attribute check.
+    """
+    __slots__ = ("history", "subscribers", "_pending")
+
+    def __init__(self, history=0):
+        self.history = deque(maxlen=history) if history else None
+        self.subscribers = []
+        self._pending = []
+
+    ## Method to register a callable receiving each batch of events:
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    ## Method to queue an event:
+    def emit(self, event):
+        self._pending.append(event)
+        if self.history is not None:
+            self.history.append(event)
+
+    ## Method to drop the queued events without delivering them:
+    def discard(self):
+        self._pending = []
+
+    ## Method to deliver the queued events:
+    def flush(self):
+        if not self._pending:
+            return
+        batch = tuple(self._pending)
+        self._pending = []
+        for callback in self.subscribers:
+            callback(batch)
+
+    # Copies of a board get an empty stream that delivers to no one:
+    def __deepcopy__(self, memo):
+        history = self.history.maxlen if self.history is not None else 0
+        return EventStream(history)
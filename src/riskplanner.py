@@ -0,0 +1,184 @@
+# Module to plan chains of attacks over a whole turn.
+
+# Package imports:
+from collections import namedtuple
+import time
+
+# User imports:
+from riskcombat import outcomes
+
+# Module variables:
+
+## Result of a plan: the probability of conquering every target, the source
+## of the chain and the targets in the order they should be attacked.
+Plan = namedtuple("Plan", ["probability", "src", "targets", "area"])
+
+# Classes:
+
+## Exception raised when the planner runs out of budget:
+class PlanningTimeout(Exception):
+    pass
+
+## Class to plan chains of attacks with dynamic programming.
+class ChainPlanner(object):
+    """
+    Plans a chain of attacks where a single stack conquers a set of target
+    territories one after the other, moving every troop but one into each
+    conquered territory. The probability of conquering the whole set is
+    computed exactly from the combat outcome tables, memoized over
+    (position, remaining forces, remaining targets), so no rollouts are needed.
+
+    `budget` is the work a planning call may do, counted as one unit per
+    expanded state, per winning outcome evaluated and per battle state swept
+    to build an outcome table, so the same board always gets the same plan.
+    A unit takes about a microsecond. `time_limit` optionally caps each call
+    in seconds as well, at the cost of reproducibility.
+    """
+
+    def __init__(self, board, budget=3000, time_limit=None):
+        self.board = board
+        self.budget = budget
+        self.time_limit = time_limit
+        self._remaining = None
+        self._deadline = None
+        self._memo = {}
+        self._wins = {}
+
+    ## Method to plan the conquest of `targets` from the territory `src`:
+    def plan(self, src, targets):
+        """
+        Returns a `Plan` with the probability of conquering every territory in
+        `targets` (IDs or territories) with the forces on `src`, and the
+        attack order with the best odds. Raises `PlanningTimeout` if the
+        budget runs out.
+        """
+        world = self.board.world
+        src = world.territory(src)
+        remaining = 0
+        for t in targets:
+            remaining |= 1 << world.territory(t).id
+
+        # A standalone plan gets its own budget; inside `bestPlan` the memo and
+        # budget are shared, since defending forces do not change mid-plan.
+        standalone = self._remaining is None
+        if standalone:
+            self._startBudget()
+        try:
+            probability = self._value(src.id, src.forces, remaining)
+        finally:
+            if standalone:
+                self._remaining = None
+        return Plan(probability, src.id,
+                    self._sequence(src.id, src.forces, remaining), None)
+
+    ## Method to find the best chain to complete an area for a player:
+    def bestPlan(self, player=None):
+        """
+        Returns the `Plan` with the best expected area bonus for `player` (by
+        default, the player whose turn it is), trying every area it does not
+        own from every territory that can start the chain. Returns None if no
+        chain was found within the budget.
+        """
+        board = self.board
+        if player is None:
+            player = board.player
+
+        self._startBudget()
+        best, best_score = None, 0.0
+        try:
+            for area in board.world.areas_by_id:
+                if area.owner is player:
+                    continue
+                targets = set(t.id for t in area.territories
+                              if t.owner is not player)
+                for src in list(player.attackers):
+                    if targets.isdisjoint(src.neighbours):
+                        continue
+                    plan = self.plan(src, targets)
+                    if plan.probability * area.value > best_score:
+                        best = plan._replace(area=area.id)
+                        best_score = plan.probability * area.value
+        except PlanningTimeout:
+            pass
+        finally:
+            self._remaining = None
+        return best
+
+    ## Method to reset the memos and the budget of a planning call:
+    def _startBudget(self):
+        self._memo = {}
+        self._wins = {}
+        self._remaining = self.budget
+        self._deadline = (None if self.time_limit is None else
+                          time.perf_counter() + self.time_limit)
+
+    ## Method to charge `cost` units of work to the budget:
+    def _charge(self, cost):
+        self._remaining -= cost
+        if self._remaining < 0 or (self._deadline is not None and
+                                   time.perf_counter() > self._deadline):
+            raise PlanningTimeout()
+
+    ## Winning (attackers left, probability) states of attacking `t` with
+    ## `forces`. Defending forces do not change mid-plan, so the outcome
+    ## tables are kept for the whole call instead of relying on the shared
+    ## cache of `outcomes`:
+    def _winStates(self, forces, t):
+        key = (forces, t)
+        wins = self._wins.get(key)
+        if wins is None:
+            defenders = self.board.world.by_id[t].forces
+            # Building a table sweeps up to forces * defenders states:
+            self._charge(forces * defenders)
+            table = outcomes(forces, defenders)
+            wins = tuple((a, p) for (a, d), p in zip(table.states,
+                                                     table.probabilities)
+                         if d == 0)
+            self._wins[key] = wins
+        return wins
+
+    ## Probability of conquering every remaining target from `pos`:
+    def _value(self, pos, forces, remaining):
+        if not remaining:
+            return 1.0
+        if forces <= 1:
+            return 0.0
+
+        key = (pos, forces, remaining)
+        if key in self._memo:
+            return self._memo[key][0]
+        self._charge(1)
+
+        best = (0.0, None)
+        for t in self.board.world.by_id[pos].neighbours:
+            if remaining >> t & 1:
+                value = self._attackValue(forces, t, remaining & ~(1 << t))
+                if value > best[0]:
+                    best = (value, t)
+
+        self._memo[key] = best
+        return best[0]
+
+    ## Probability of finishing the chain after attacking `t`:
+    def _attackValue(self, forces, t, remaining):
+        wins = self._winStates(forces, t)
+        self._charge(len(wins))
+        value = 0.0
+        for a, p in wins:
+            value += p * self._value(t, a - 1, remaining)
+        return value
+
+    ## Attack order following the best choices along the most likely path:
+    def _sequence(self, pos, forces, remaining):
+        sequence = []
+        while remaining:
+            best = self._memo.get((pos, forces, remaining))
+            if best is None or best[1] is None:
+                break
+            t = best[1]
+            sequence.append(t)
+            # Follow the most likely victory:
+            p, a = max((p, a) for a, p in self._wins[(forces, t)])
+            pos, forces = t, a - 1
+            remaining &= ~(1 << t)
+        return sequence
@@ -1,12 +1,13 @@
 # Module to represent a Risk player.
 
-# Package imports:
-from copy import deepcopy
+# User imports:
+from territory import _deepcopySlots
 
 # Classes:
 
 ## Class to store the basic information of a player:
 class PlayerInfo(object):
+    __slots__ = ("name", "type", "ai")
 
     # Constructor:
     def __init__(self, name, type, ai=None):
@@ -16,75 +17,166 @@ class PlayerInfo(object):
 
 ## Class to store the basic mechanics of a risk player. May be an AI or Agent.
 class RiskPlayer(object):
+    __slots__ = ("id", "name", "world", "type", "color", "ai", "_territories",
+                 "_forces", "_areas", "_bonus", "_frontier", "_attackers",
+                 "_parent", "_regions")
 
     # Constructor:
     def __init__(self, name, board, type, ai=None):
+        # Players are numbered in the order they join the board:
+        self.id = len(board.players)
         self.name = name
         self.world = board.world
         self.type = type
         self.color = 0
 
+        # Aggregates kept up to date by the board as the game goes on. The
+        # owned territories are stored as the keys of an ordered dictionary:
+        self._territories = {}
+        self._forces = 0
+
+        # Owned areas and the sum of their reinforcement bonuses:
+        self._areas = {}
+        self._bonus = 0
+
+        # Owned territories on the border, and the ones among them with more
+        # than one troop (the ones that can attack):
+        self._frontier = {}
+        self._attackers = {}
+
+        # Union-find forest of the owned territory IDs, grouping territories
+        # connected through owned territory. Gaining a territory joins it to
+        # the forest; losing one drops the forest, which is rebuilt on the
+        # next query. The regions as sets are cached until the next change:
+        self._parent = {}
+        self._regions = None
+
+        self.ai = None
         if(type == "AI" and ai != None):
             self.ai = ai(self, board, board.world)
 
     # Property methods:
     @property
     def territories(self):
-        for t in self.world.territories.values():
-            if t.owner == self:
-                yield t
+        return iter(tuple(self._territories))
+
+    @property
+    def frontier(self):
+        # Live view: copy it before changing the board while iterating.
+        return self._frontier.keys()
+
+    @property
+    def attackers(self):
+        # Live view: copy it before changing the board while iterating.
+        return self._attackers.keys()
 
     @property
     def territory_count(self):
-        count = 0
-        for t in self.world.territories.values():
-            if t.owner == self:
-                count += 1
-        return count
+        return len(self._territories)
 
     @property
     def areas(self):
-        for a in self.world.areas.values():
-            if a.owner == self:
-                yield a
+        return iter(tuple(self._areas))
 
     @property
     def forces(self):
-        return sum(t.forces for t in self.territories)
+        return self._forces
 
     @property
     def alive(self):
-        return self.territory_count > 0
+        return len(self._territories) > 0
 
     @property
     def reinforcements(self):
-        return max(self.territory_count//3, 3) + sum(a.value for a in self.areas)
+        return max(len(self._territories)//3, 3) + self._bonus
 
     # Methods:
     def canAttack(self):
-        for territory in self.territories:
-            # If even a single territory has a target on it's border and more
-            # than one troop, we can still attack!
-            if(territory.forces > 1 and territory.border):
-                return True
-
-        # Else, we cannot attack.
-        return False
+        # If even a single territory has a target on it's border and more
+        # than one troop, we can still attack!
+        return len(self._attackers) > 0
+
+    def connected(self, a, b):
+        # Can troops move from territory a to territory b?
+        if a.owner is not self or b.owner is not self:
+            return False
+        return self._find(a.id) == self._find(b.id)
+
+    def region(self, t):
+        # Owned territories reachable from territory t, including itself:
+        if t.owner is not self:
+            return frozenset()
+        return self._regionsByRoot()[self._find(t.id)]
+
+    def regions(self):
+        # Connected regions of owned territory:
+        return list(self._regionsByRoot().values())
+
+    # Private methods:
+
+    ## Method to record a gained territory:
+    def _joinRegion(self, t):
+        self._regions = None
+        if self._parent is not None:
+            self._union(self._parent, t)
+
+    ## Method to record a lost territory, dropping the forest:
+    def _leaveRegion(self, t):
+        self._parent = None
+        self._regions = None
+
+    ## Method to add a territory to a union-find forest:
+    def _union(self, parent, t):
+        parent[t.id] = t.id
+        for n in t.connect:
+            if n.id in parent:
+                root, other = self._find(t.id), self._find(n.id)
+                if root != other:
+                    parent[other] = root
+
+    ## Method to return the forest, rebuilding it if needed:
+    def _forest(self):
+        parent = self._parent
+        if parent is None:
+            self._parent = parent = {}
+            for t in self._territories:
+                self._union(parent, t)
+        return parent
+
+    ## Method to find the root of a territory ID:
+    def _find(self, i):
+        parent = self._forest()
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    ## Method to return the cached regions indexed by their root:
+    def _regionsByRoot(self):
+        if self._regions is None:
+            regions = {}
+            for t in self._territories:
+                regions.setdefault(self._find(t.id), []).append(t)
+            self._regions = {root: frozenset(ts)
+                             for root, ts in regions.items()}
+        return self._regions
 
     # Overwriting default object methods:
     def __repr__(self):
         return "P;%s" % (self.name)
 
     def __hash__(self):
-        return hash(("player", self.name))
+        return self.id
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, RiskPlayer):
-            return self.name == other.name
+            return self.id == other.id
         return False
 
     def __deepcopy__(self, memo):
-        newobj = RiskPlayer(self.name, self, lambda *x, **y: None, {})
-        newobj.color = self.color
-        newobj.world = deepcopy(self.world, memo)
-        return newobj
+        # Copies hold the game state only: they share no AI, since the AI is
+        # bound to the original board, so the board refuses to play their
+        # turns.
+        return _deepcopySlots(self, memo, {"ai": None})
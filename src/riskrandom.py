@@ -0,0 +1,71 @@
+# Module to generate the random numbers used by a Risk game.
+
+# Package imports:
+import numpy as np
+
+# Module variables:
+
+## Number of uniform numbers drawn from the generator at a time. Every
+## environment owns a pool of boxed floats, so it is kept small; larger pools
+## barely lower the cost of a draw:
+POOL_SIZE = 128
+
+# Functions:
+
+## Function to split `seed` into `n` independent integer seeds, one per
+## environment, or `n` None seeds (fresh entropy) if `seed` is None:
+def spawnSeeds(seed, n):
+    if seed is None:
+        return [None] * n
+    return [int(child.generate_state(1, np.uint64)[0])
+            for child in np.random.SeedSequence(seed).spawn(n)]
+
+# Classes:
+
+## Class to store a seeded random stream with a pool of pre-drawn numbers.
+class RiskRandom(object):
+    """
+    Random stream for a single game or environment. Uniform numbers are drawn
+    from a NumPy generator in vectorized blocks of `pool_size` and handed out
+    one at a time, so a dice draw costs a list lookup instead of a call into
+    the generator.
+
+    `seed` may be an int, a `np.random.SeedSequence` or None (fresh entropy).
+    Seeds for parallel environments should be split with `spawnSeeds()`,
+    which is deterministic for a given seed.
+    """
+    __slots__ = ("seed_sequence", "generator", "pool_size", "_pool", "_next")
+
+    def __init__(self, seed=None, pool_size=POOL_SIZE):
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        self.seed_sequence = seed
+        self.generator = np.random.Generator(np.random.PCG64(seed))
+        self.pool_size = pool_size
+        self._pool = []
+        self._next = 0
+
+    ## Method to return a uniform number in [0, 1):
+    def random(self):
+        i = self._next
+        if i == len(self._pool):
+            self._pool = self.generator.random(self.pool_size).tolist()
+            i = 0
+        self._next = i + 1
+        return self._pool[i]
+
+    ## Method to return a uniform integer in [a, b]:
+    def randint(self, a, b):
+        return a + int(self.random() * (b - a + 1))
+
+    ## Method to return a uniform element of a non-empty sequence:
+    def choice(self, seq):
+        if not seq:
+            raise IndexError('Cannot choose from an empty sequence')
+        return seq[int(self.random() * len(seq))]
+
+    ## Method to shuffle a list in place:
+    def shuffle(self, x):
+        for i in range(len(x) - 1, 0, -1):
+            j = int(self.random() * (i + 1))
+            x[i], x[j] = x[j], x[i]
@@ -0,0 +1,333 @@
+# Module to step several Risk environments as a batch.
+
+# Package imports:
+import functools
+import multiprocessing
+import numpy as np
+from gym import spaces
+
+# User imports:
+from riskrandom import spawnSeeds
+
+# Functions:
+
+## Function to write the observation of a RiskEnv into a flat array:
+def flattenObservation(observation, out):
+    """
+    Writes `observation` as (game state, owner 1, armies 1, owner 2, ...) into
+    `out`, in the same order used by `FlattenRiskWrapper`. Observations of
+    the "array" mode already have this layout and are copied as they are.
+    """
+    if isinstance(observation, np.ndarray):
+        out[:] = observation
+        return out
+    game_state, territories = observation
+    out[0] = game_state
+    i = 1
+    for owner, armies in territories.values():
+        out[i] = owner
+        out[i+1] = armies
+        i += 2
+    return out
+
+## Function to build the factories of `n` environments, seeded with
+## `spawnSeeds(seed, n)`. The factories can be pickled, so they can be sent to
+## worker processes:
+def makeEnvs(env_class, n, opponents, seed=None, **kwargs):
+    return [functools.partial(_makeEnv, env_class, opponents, env_seed, kwargs)
+            for env_seed in spawnSeeds(seed, n)]
+
+## Function to build a seeded environment:
+def _makeEnv(env_class, opponents, seed, kwargs):
+    env = env_class(opponents, **kwargs)
+    if seed is not None:
+        env.seed(seed)
+    return env
+
+## Function to write the observation of environment `i` into the stacked
+## observation buffers:
+def _writeObservation(observation, buffers, i):
+    if len(buffers) == 1:
+        flattenObservation(observation, buffers[0][i])
+    else:
+        # Graph mode: game state and node features.
+        buffers[0][i], buffers[1][i] = observation
+
+## Function to copy the stacked observation buffers, or the row `i` of them:
+def _copyObservation(buffers, i=slice(None)):
+    if len(buffers) == 1:
+        return buffers[0][i].copy()
+    return tuple(b[i].copy() for b in buffers)
+
+## Function to step an environment, resetting it when the game is over:
+def _stepEnv(env, action, obs, terminal, i):
+    observation, reward, done, info = env.step(tuple(int(a) for a in action))
+    if done:
+        _writeObservation(observation, terminal, i)
+        observation = env.reset()
+    _writeObservation(observation, obs, i)
+    return reward, done, info
+
+## Function to build the single environment observation space:
+def _observationSpace(env):
+    # Graph observations keep their (game state, node features) layout:
+    if env.observation_mode == "graph":
+        return env.observation_space
+    return spaces.MultiDiscrete(
+        [3] + [env.player_range, env.army_range] * len(env.country_list),
+        dtype=np.uint8)
+
+## Function to get the shape of each stacked observation buffer of a single
+## environment: the flat observation, or the game state and node features:
+def _observationShapes(space):
+    if isinstance(space, spaces.Tuple):
+        return ((), space.spaces[1].shape)
+    return (space.shape,)
+
+## Function to view the shared buffers of a RiskSubprocVecEnv as the arrays of
+## actions, observations, terminal observations, rewards and dones:
+def _sharedArrays(raw, shapes):
+    actions, obs, terminal, rewards, dones = raw
+    n = len(rewards)
+    return (np.frombuffer(actions, dtype=np.int32).reshape(n, -1),
+            tuple(np.frombuffer(b, dtype=np.uint8).reshape((n,) + shape)
+                  for b, shape in zip(obs, shapes)),
+            tuple(np.frombuffer(b, dtype=np.uint8).reshape((n,) + shape)
+                  for b, shape in zip(terminal, shapes)),
+            np.frombuffer(rewards, dtype=np.float32),
+            np.frombuffer(dones, dtype=np.int8))
+
+## Function run by the workers of a RiskSubprocVecEnv:
+def _worker(remote, parent_remote, env_fns, start, raw, shapes):
+    parent_remote.close()
+    envs = [make() for make in env_fns]
+    stop = start + len(envs)
+
+    # Views of this worker's rows of the shared buffers:
+    actions, obs, terminal, rewards, dones = _sharedArrays(raw, shapes)
+    actions, rewards, dones = (actions[start:stop], rewards[start:stop],
+                               dones[start:stop])
+    obs = tuple(b[start:stop] for b in obs)
+    terminal = tuple(b[start:stop] for b in terminal)
+
+    try:
+        while True:
+            command, data = remote.recv()
+            if command == "step":
+                infos = []
+                for i, env in enumerate(envs):
+                    rewards[i], dones[i], info = _stepEnv(
+                        env, actions[i], obs, terminal, i)
+                    if info:
+                        infos.append((start + i, info))
+                remote.send(infos)
+            elif command == "reset":
+                for i, env in enumerate(envs):
+                    _writeObservation(env.reset(), obs, i)
+                remote.send(None)
+            elif command == "seed":
+                remote.send([env.seed(s) for env, s in zip(envs, data)])
+            elif command == "close":
+                for env in envs:
+                    env.close()
+                remote.close()
+                break
+    except KeyboardInterrupt:
+        pass
+
+# Classes:
+
+## Class to step N Risk environments in lockstep.
+class RiskVecEnv(object):
+    """
+    Steps the environments built by `env_fns` together. Actions are taken as
+    an (N, 3) integer array and observations, rewards and dones are returned
+    as stacked arrays. A finished game is reset right away: its final
+    observation is stored in `infos[i]["terminal_observation"]` and the
+    returned observation is the first one of the next game.
+
+    In the "graph" observation mode, observations are returned as a tuple of
+    the stacked game states, shaped (N,), and node features, shaped
+    (N, 42, F). Every other mode is stacked in the flat layout of
+    `flattenObservation`, shaped (N, 85).
+
+    `observation_space` and `action_space` describe a single environment.
+    """
+
+    def __init__(self, env_fns):
+        self.envs = [make() for make in env_fns]
+        self.num_envs = len(self.envs)
+
+        env = self.envs[0]
+        self.action_space = env.action_space
+        self.observation_space = _observationSpace(env)
+
+        # Stacked buffers, reused across steps:
+        shapes = _observationShapes(self.observation_space)
+        self._obs = tuple(np.zeros((self.num_envs,) + shape, dtype=np.uint8)
+                          for shape in shapes)
+        self._terminal = tuple(np.zeros((self.num_envs,) + shape,
+                                        dtype=np.uint8) for shape in shapes)
+        self._rewards = np.zeros(self.num_envs, dtype=np.float32)
+        self._dones = np.zeros(self.num_envs, dtype=bool)
+        self._actions = None
+
+    ## Method to reset every environment:
+    def reset(self):
+        for i, env in enumerate(self.envs):
+            _writeObservation(env.reset(), self._obs, i)
+        return _copyObservation(self._obs)
+
+    ## Method to step every environment:
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    ## Method to store the actions of the next step:
+    def step_async(self, actions):
+        self._actions = np.asarray(actions)
+
+    ## Method to run the stored actions:
+    def step_wait(self):
+        infos = []
+        for i, (env, action) in enumerate(zip(self.envs, self._actions)):
+            self._rewards[i], self._dones[i], info = _stepEnv(
+                env, action, self._obs, self._terminal, i)
+            if self._dones[i]:
+                info["terminal_observation"] = _copyObservation(
+                    self._terminal, i)
+            infos.append(info)
+        self._actions = None
+        return (_copyObservation(self._obs), self._rewards.copy(),
+                self._dones.copy(), infos)
+
+    ## Method to seed every environment with `spawnSeeds(seed, N)`:
+    def seed(self, seed=None):
+        return [env.seed(s)
+                for env, s in zip(self.envs, spawnSeeds(seed, self.num_envs))]
+
+    ## Method to close every environment:
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+## Class to step N Risk environments in worker processes.
+class RiskSubprocVecEnv(object):
+    """
+    Same interface as `RiskVecEnv`, with the environments split between
+    `workers` processes (by default, one per CPU). Each worker owns its
+    boards and writes its observations, rewards and dones straight into
+    shared memory, so only the commands and non-empty info dicts go through
+    the pipes.
+
+    `step_async` returns as soon as the actions are handed out, so the
+    opponents' turns run while the caller works on the previous batch;
+    `step_wait` collects the results.
+    """
+
+    def __init__(self, env_fns, workers=None, start_method=None):
+        self.num_envs = len(env_fns)
+        workers = min(workers or multiprocessing.cpu_count(), self.num_envs)
+        context = multiprocessing.get_context(start_method)
+
+        # Spaces of a single environment, read from a local copy:
+        env = env_fns[0]()
+        self.action_space = env.action_space
+        self.observation_space = _observationSpace(env)
+        env.close()
+
+        # Shared buffers of every environment:
+        n = self.num_envs
+        shapes = _observationShapes(self.observation_space)
+        sizes = [n * int(np.prod(shape)) for shape in shapes]
+        raw = (context.RawArray("i", n * len(self.action_space.spaces)),
+               tuple(context.RawArray("B", size) for size in sizes),
+               tuple(context.RawArray("B", size) for size in sizes),
+               context.RawArray("f", n),
+               context.RawArray("b", n))
+        (self._actions, self._obs, self._terminal, self._rewards,
+         self._dones) = _sharedArrays(raw, shapes)
+
+        # Split the environments in contiguous blocks, one per worker:
+        self.remotes = []
+        self.processes = []
+        bounds = np.linspace(0, n, workers + 1).astype(int)
+        self._blocks = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+        for start, stop in self._blocks:
+            remote, work_remote = context.Pipe()
+            process = context.Process(
+                target=_worker,
+                args=(work_remote, remote, env_fns[start:stop], start,
+                      raw, shapes),
+                daemon=True)
+            process.start()
+            work_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+
+        self.waiting = False
+        self.closed = False
+
+    ## Method to reset every environment:
+    def reset(self):
+        self._checkIdle()
+        for remote in self.remotes:
+            remote.send(("reset", None))
+        for remote in self.remotes:
+            remote.recv()
+        return _copyObservation(self._obs)
+
+    ## Method to step every environment:
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    ## Method to hand the actions to the workers:
+    def step_async(self, actions):
+        # The workers read the actions from shared memory during the step:
+        self._checkIdle()
+        self._actions[:] = actions
+        for remote in self.remotes:
+            remote.send(("step", None))
+        self.waiting = True
+
+    ## Method to wait for the workers to finish the step:
+    def step_wait(self):
+        infos = [{} for i in range(self.num_envs)]
+        for remote in self.remotes:
+            for i, info in remote.recv():
+                infos[i] = info
+        self.waiting = False
+
+        dones = self._dones.astype(bool)
+        for i in np.flatnonzero(dones):
+            infos[i]["terminal_observation"] = _copyObservation(
+                self._terminal, i)
+        return _copyObservation(self._obs), self._rewards.copy(), dones, infos
+
+    ## Method to seed every environment with `spawnSeeds(seed, N)`:
+    def seed(self, seed=None):
+        self._checkIdle()
+        seeds = spawnSeeds(seed, self.num_envs)
+        for remote, (start, stop) in zip(self.remotes, self._blocks):
+            remote.send(("seed", seeds[start:stop]))
+        return [s for remote in self.remotes for s in remote.recv()]
+
+    ## Method to check that no step is pending, since the workers answer the
+    ## commands in order:
+    def _checkIdle(self):
+        assert not self.waiting, "call step_wait() before sending a new command"
+
+    ## Method to stop the workers:
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
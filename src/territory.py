@@ -3,25 +3,59 @@
 # Package imports:
 from copy import deepcopy
 import logging
+import numbers
+
+# User imports:
+from topology import Topology
 
 # Logger configuration:
 LOG = logging.getLogger("risk-board")
 
+# Functions:
+
+## Deep copy an object that stores its state in __slots__:
+def _deepcopySlots(obj, memo, overrides=None):
+    # Slots named in `overrides` are set to the given values instead of
+    # being copied.
+    newobj = obj.__class__.__new__(obj.__class__)
+    memo[id(obj)] = newobj
+    slots = [s for cls in obj.__class__.__mro__
+             for s in getattr(cls, "__slots__", ())]
+    # The ID goes first, since it is the hash used by the copied containers.
+    newobj.id = obj.id
+    for s in slots:
+        if overrides is not None and s in overrides:
+            setattr(newobj, s, overrides[s])
+        elif hasattr(obj, s):
+            setattr(newobj, s, deepcopy(getattr(obj, s), memo))
+    return newobj
+
 # Classes:
 
 ## Class to model a territory.
 class Territory(object):
-    def __init__(self, name, area):
+    __slots__ = ("id", "name", "area", "owner", "forces", "connect",
+                 "neighbours", "ord", "hostile")
+
+    def __init__(self, name, area, id=None):
+        self.id = id
         self.name = name
         self.area = area
         self.owner = None
         self.forces = 0
-        self.connect = set()
         self.ord = None
 
+        # Neighbouring territories, and their IDs shared with the topology:
+        self.connect = ()
+        self.neighbours = ()
+
+        # Number of neighbours owned by another player, kept up to date by the
+        # board:
+        self.hostile = 0
+
     @property
     def border(self):
-        return any(t.owner and t.owner != self.owner for t in self.connect)
+        return self.hostile > 0
 
     @property
     def area_owned(self):
@@ -44,38 +78,46 @@ class Territory(object):
         return "T;%s" % self.name
 
     def __hash__(self):
-        return hash(("territory", self.name))
+        return self.id
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, Territory):
-            return self.name == other.name
+            return self.id == other.id
         return False
 
     def __deepcopy__(self, memo):
-        newobj = Territory(self.name, None)
-        newobj.__dict__.update(deepcopy(self.__dict__, memo))
-        return newobj
+        return _deepcopySlots(self, memo)
 
 ## Class to model an area from the map.
 class Area(object):
-    def __init__(self, name, value):
+    __slots__ = ("id", "name", "value", "territories", "counts", "_owner",
+                 "_adjacent")
+
+    def __init__(self, name, value, id=None):
+        self.id = id
         self.name = name
         self.value = value
-        self.territories = set()
+        self.territories = ()
+
+        # Number of territories owned by each player and the player owning
+        # every territory, kept up to date by the board:
+        self.counts = {}
+        self._owner = None
+
+        # Neighbouring areas, computed on first use:
+        self._adjacent = None
 
     def __getinitargs__(self):
-        return (self.name, self.value)
+        return (self.name, self.value, self.id)
 
     def __repr__(self):
         return "A;%s" % self.name
 
     @property
     def owner(self):
-        owners = set(t.owner for t in self.territories)
-        if len(owners) == 1:
-            return owners.pop()
-        else:
-            return None
+        return self._owner
 
     @property
     def forces(self):
@@ -83,70 +125,81 @@ class Area(object):
 
     @property
     def adjacent(self):
-        adj = set()
-        for t in self.territories:
-            for tt in t.connect:
-                if tt.area != self:
-                    adj.add(tt.area)
-        return adj
+        if self._adjacent is None:
+            self._adjacent = frozenset(tt.area for t in self.territories
+                                       for tt in t.connect if tt.area != self)
+        return self._adjacent
 
     def __hash__(self):
-        return hash(("area", self.name))
+        return self.id
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if isinstance(other, Area):
-            return self.name == other.name
+            return self.id == other.id
         return False
 
     def __deepcopy__(self, memo):
-        newobj = Area(self.name, None)
-        newobj.__dict__.update(deepcopy(self.__dict__, memo))
-        return newobj
+        return _deepcopySlots(self, memo)
 
 ## Class to represent the entire world map.
 class World(object):
-    ords = list(map(ord, r'\/|-+'))
+
     def __init__(self):
+        # Territories and areas indexed by ID:
+        self.by_id = []
+        self.areas_by_id = []
+
+        # Territories and areas indexed by name, for the API edge:
         self.territories = {}
         self.areas = {}
 
+        self.topology = None
+
     def territory(self, t):
-        if t in self.territories.keys():
-            return self.territories[t]
-        elif t in self.territories.values():
-            return t
-        else:
-            return None
+        # Territory IDs are the primary key; names and territory objects are
+        # accepted at the API edge.
+        if not isinstance(t, numbers.Integral):
+            if isinstance(t, Territory):
+                t = t.id
+            else:
+                return self.territories.get(t)
+        if 0 <= t < len(self.by_id):
+            return self.by_id[t]
+        return None
 
     def area(self, a):
-        if a in self.areas.keys():
-            return self.areas[a]
-        elif a in self.areas.values():
-            return a
-        else:
-            return None
+        if not isinstance(a, numbers.Integral):
+            if isinstance(a, Area):
+                a = a.id
+            else:
+                return self.areas.get(a)
+        if 0 <= a < len(self.areas_by_id):
+            return self.areas_by_id[a]
+        return None
 
     def load(self, areas, connections):
-        for name, (value, territories) in areas.items():
+        self.loadTopology(Topology(areas, connections))
+
+    def loadTopology(self, topology):
+        self.topology = topology
+        self.by_id = []
+        self.areas_by_id = []
+        for a, name in enumerate(topology.area_names):
             LOG.debug("Creating area=%s", name)
-            area = Area(name, value)
+            area = Area(name, topology.area_values[a], a)
             self.areas[name] = area
-            for t in territories:
-                LOG.debug("Creating territory=%s", t)
-                territory = Territory(t, area)
-                area.territories.add(territory)
-                self.territories[t] = territory
-        for line in filter(lambda l: l.strip(), connections.split('\n')):
-            joins = [t.strip() for t in line.split('--')]
-            for i in range(len(joins) - 1):
-                t0 = self.territories[joins[i]]
-                t1 = self.territories[joins[i+1]]
-                t0.connect.add(t1)
-                t1.connect.add(t0)
-        for t in self.territories.values():
-            avail = set(self.ords)
-            for c in t.connect:
-                if c.ord in avail:
-                    avail.remove(c.ord)
-            assert avail
-            t.ord = avail.pop()
+            self.areas_by_id.append(area)
+        for i, name in enumerate(topology.names):
+            LOG.debug("Creating territory=%s", name)
+            area = self.areas_by_id[topology.territory_area[i]]
+            territory = Territory(name, area, i)
+            territory.ord = topology.ords[i]
+            territory.neighbours = topology.neighbours[i]
+            self.territories[name] = territory
+            self.by_id.append(territory)
+        for t in self.by_id:
+            t.connect = tuple(self.by_id[c] for c in t.neighbours)
+        for area, members in zip(self.areas_by_id, topology.area_members):
+            area.territories = tuple(self.by_id[t] for t in members)
@@ -0,0 +1,114 @@
+# Module to store the static topology of the Risk world map.
+
+# Package imports:
+from collections import deque
+from types import MappingProxyType
+
+# User imports:
+from world import CONNECT, AREAS
+
+# Classes:
+
+## Class to store the compiled, immutable topology of a world map.
+class Topology(object):
+    """
+    Static description of a world map, compiled once and shared by every
+    board. Territories are numbered in alphabetical order of their names, so
+    the IDs match the indexes of `RiskEnv.country_list`. Areas are numbered in
+    the order they are declared.
+
+    Attributes:
+        names: territory name of each territory ID.
+        index: mapping of territory name -> territory ID.
+        neighbours: tuple of neighbour territory IDs of each territory ID.
+        area_names: area name of each area ID.
+        area_index: mapping of area name -> area ID.
+        area_values: reinforcement bonus of each area ID.
+        area_members: tuple of territory IDs in each area ID.
+        territory_area: area ID of each territory ID.
+        ords: map drawing character of each territory ID.
+        distance: all-pairs matrix with the number of borders crossed between
+            two territories.
+    """
+    ords = tuple(map(ord, r'\/|-+'))
+
+    def __init__(self, areas, connections):
+        names = sorted(t for value, territories in areas.values()
+                       for t in territories)
+        index = {name: i for i, name in enumerate(names)}
+
+        # Areas:
+        area_names = tuple(areas)
+        territory_area = [None] * len(names)
+        for a, name in enumerate(area_names):
+            for t in areas[name][1]:
+                territory_area[index[t]] = a
+
+        # Connections:
+        connect = [set() for name in names]
+        for line in filter(lambda l: l.strip(), connections.split('\n')):
+            joins = [index[t.strip()] for t in line.split('--')]
+            for i in range(len(joins) - 1):
+                connect[joins[i]].add(joins[i+1])
+                connect[joins[i+1]].add(joins[i])
+
+        # Map drawing characters, assigned in declaration order so no two
+        # neighbours share one:
+        ords = [None] * len(names)
+        for name in area_names:
+            for t in areas[name][1]:
+                avail = set(self.ords) - set(ords[c] for c in connect[index[t]])
+                assert avail
+                ords[index[t]] = avail.pop()
+
+        self.__dict__.update(
+            source=(areas, connections),
+            names=tuple(names),
+            index=MappingProxyType(index),
+            neighbours=tuple(tuple(sorted(c)) for c in connect),
+            area_names=area_names,
+            area_index=MappingProxyType({n: a for a, n in enumerate(area_names)}),
+            area_values=tuple(areas[name][0] for name in area_names),
+            area_members=tuple(tuple(index[t] for t in areas[name][1])
+                               for name in area_names),
+            territory_area=tuple(territory_area),
+            ords=tuple(ords),
+        )
+        self.__dict__["distance"] = tuple(self._distances(t)
+                                          for t in range(len(names)))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Topology is immutable")
+
+    # Topologies are immutable, so copies share them:
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        if self is TOPOLOGY:
+            return "TOPOLOGY"
+        return (Topology, self.source)
+
+    ## Breadth-first search for the distances from a territory:
+    def _distances(self, src):
+        distance = [None] * len(self.names)
+        distance[src] = 0
+        queue = deque([src])
+        while queue:
+            t = queue.popleft()
+            for c in self.neighbours[t]:
+                if distance[c] is None:
+                    distance[c] = distance[t] + 1
+                    queue.append(c)
+        return tuple(distance)
+
+# Module variables:
+
+## Topology of the standard world map, shared by every board in the process:
+TOPOLOGY = Topology(AREAS, CONNECT)